@@ -2,12 +2,14 @@ import streamlit as st
 import cv2
 import numpy as np
 import time
+import zlib
 from datetime import datetime
 import os
 import pandas as pd
-from utils.camera import VideoCapture
+from utils.camera import VideoCapture, ThreadedFrameSource
 from utils.detection import ProductDetector
-from utils.database import InspectionDatabase
+from utils.database import get_db
+from utils.pipeline import InspectionPipeline
 from utils.reporting import generate_session_summary
 
 # Set page configuration
@@ -18,17 +20,20 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Database shared by all sessions and pages
+inspection_db = get_db()
+
 # Initialize session state variables
 if 'detector' not in st.session_state:
     st.session_state.detector = ProductDetector()
-if 'inspection_db' not in st.session_state:
-    st.session_state.inspection_db = InspectionDatabase()
 if 'product_count' not in st.session_state:
     st.session_state.product_count = {'total': 0, 'good': 0, 'bad': 0}
 if 'inspection_active' not in st.session_state:
     st.session_state.inspection_active = False
 if 'session_start_time' not in st.session_state:
     st.session_state.session_start_time = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = None
 if 'current_product_info' not in st.session_state:
     st.session_state.current_product_info = {
         'name': 'Default Product',
@@ -36,28 +41,70 @@ if 'current_product_info' not in st.session_state:
         'company': 'Company Name',
         'inspection_criteria': 'Standard'
     }
+if '_prod_tuple' not in st.session_state:
+    st.session_state._prod_tuple = (
+        st.session_state.current_product_info['name'],
+        st.session_state.current_product_info['batch_number'],
+        st.session_state.current_product_info['company']
+    )
 if 'detection_threshold' not in st.session_state:
     st.session_state.detection_threshold = 0.5
 if 'processing_fps' not in st.session_state:
     st.session_state.processing_fps = 0
+if 'frame_source' not in st.session_state:
+    st.session_state.frame_source = None
+if 'pipeline' not in st.session_state:
+    st.session_state.pipeline = None
+if '_last_frame_hash' not in st.session_state:
+    st.session_state._last_frame_hash = None
+    st.session_state._last_jpeg = None
+
+# Largest frame height sent to the browser
+DISPLAY_HEIGHT = 720
+
+def encode_frame(frame):
+    """
+    JPEG-encode a BGR frame for display, reusing the last encoding
+    when the frame has not changed
+    """
+    frame_hash = zlib.crc32(frame)
+    if frame_hash != st.session_state._last_frame_hash:
+        h, w = frame.shape[:2]
+        if h > DISPLAY_HEIGHT:
+            frame = cv2.resize(frame, (w * DISPLAY_HEIGHT // h, DISPLAY_HEIGHT), interpolation=cv2.INTER_AREA)
+        _, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        st.session_state._last_frame_hash = frame_hash
+        st.session_state._last_jpeg = buf.tobytes()
+    return st.session_state._last_jpeg
 
 def toggle_inspection():
     if st.session_state.inspection_active:
         st.session_state.inspection_active = False
+        # Stop the background capture and detection pipeline
+        if st.session_state.pipeline is not None:
+            st.session_state.pipeline.stop()
+            st.session_state.pipeline = None
+        if st.session_state.frame_source is not None:
+            st.session_state.frame_source.stop()
+            st.session_state.frame_source = None
+        # Write out any buffered inspection records and close the session
+        inspection_db.end_session(st.session_state.session_id)
         # Generate summary when stopping inspection
         if st.session_state.session_start_time:
             session_duration = (datetime.now() - st.session_state.session_start_time).total_seconds()
             generate_session_summary(
-                st.session_state.inspection_db,
+                inspection_db,
                 st.session_state.product_count,
                 st.session_state.current_product_info,
-                session_duration
+                session_duration,
+                session_id=st.session_state.session_id
             )
     else:
         st.session_state.inspection_active = True
         st.session_state.session_start_time = datetime.now()
         st.session_state.product_count = {'total': 0, 'good': 0, 'bad': 0}
-        st.session_state.inspection_db.start_new_session(
+        # The database is shared by all users, so each keeps its own session ID
+        st.session_state.session_id = inspection_db.start_new_session(
             st.session_state.current_product_info['name'],
             st.session_state.current_product_info['batch_number']
         )
@@ -72,12 +119,13 @@ with st.sidebar:
     company_name = st.text_input("Company Name", st.session_state.current_product_info['company'])
     
     # Update product info in session state
-    if product_name != st.session_state.current_product_info['name'] or \
-       batch_number != st.session_state.current_product_info['batch_number'] or \
-       company_name != st.session_state.current_product_info['company']:
-        st.session_state.current_product_info['name'] = product_name
-        st.session_state.current_product_info['batch_number'] = batch_number
-        st.session_state.current_product_info['company'] = company_name
+    if (product_name, batch_number, company_name) != st.session_state._prod_tuple:
+        st.session_state._prod_tuple = (product_name, batch_number, company_name)
+        st.session_state.current_product_info.update(
+            name=product_name,
+            batch_number=batch_number,
+            company=company_name
+        )
     
     st.subheader("Detection Settings")
     detection_threshold = st.slider("Detection Threshold", 0.0, 1.0, st.session_state.detection_threshold, 0.05)
@@ -139,64 +187,87 @@ with col2:
         st.write(f"**Batch:** {st.session_state.current_product_info['batch_number']}")
         st.write(f"**Company:** {st.session_state.current_product_info['company']}")
 
-# Main loop for video processing
+# Video processing
 # In a real application, this would process the camera feed
-if camera_source == "Demo Video":
-    # Demo mode using a sample video
+@st.fragment(run_every=0.1)
+def video_tick():
+    """Render the latest inspection results without rerunning the whole page"""
     from utils.demo_video import get_demo_frame
     
-    while True:
-        # Update metrics with current counts
-        total_count_metric.metric("Total Products", st.session_state.product_count['total'])
-        good_count_metric.metric("Good Products", st.session_state.product_count['good'])
-        bad_count_metric.metric("Defective Products", st.session_state.product_count['bad'])
-        processing_speed_metric.metric("Processing Speed", f"{st.session_state.processing_fps:.1f} FPS")
+    processed_frame = None
+    if st.session_state.inspection_active:
+        # Frames are generated on their own thread and fed through the
+        # background capture and detection pipeline. The pipeline stops by
+        # itself when its results are no longer fetched, e.g. after the tab
+        # was closed, so start it again if this session comes back.
+        if st.session_state.pipeline is not None and st.session_state.pipeline.stopped:
+            st.session_state.pipeline = None
+            st.session_state.frame_source.stop()
+            st.session_state.frame_source = None
+        if st.session_state.frame_source is None:
+            st.session_state.frame_source = ThreadedFrameSource(
+                get_demo_frame, frame_interval=0.1
+            ).start()
+        if st.session_state.pipeline is None:
+            st.session_state.pipeline = InspectionPipeline(
+                st.session_state.detector, st.session_state.frame_source.read, frame_interval=0
+            ).start()
+        pipeline = st.session_state.pipeline
+        
+        product_name = st.session_state.current_product_info['name']
+        batch_number = st.session_state.current_product_info['batch_number']
+        records = []
         
-        if st.session_state.inspection_active:
-            # Get a demo frame
-            start_time = time.time()
-            frame = get_demo_frame()
-            
-            # Process frame with detector
-            processed_frame, detections = st.session_state.detector.process_frame(frame)
-            
+        for processed_frame, detections in pipeline.get_results():
             # Update product counts based on detections
-            if detections:
-                new_products = len(detections)
+            qualities = detections['qualities']
+            if qualities.size:
+                new_products = qualities.size
                 st.session_state.product_count['total'] += new_products
                 
                 # Count good and bad products
-                good_products = sum(1 for d in detections if d['quality'] == 'good')
+                good_products = int(np.count_nonzero(qualities == b'good'))
                 bad_products = new_products - good_products
                 
                 st.session_state.product_count['good'] += good_products
                 st.session_state.product_count['bad'] += bad_products
                 
-                # Record detections in database
+                # Collect the detections to record in the database
                 timestamp = datetime.now()
-                for detection in detections:
-                    st.session_state.inspection_db.add_inspection_record(
-                        product_id=detection['id'],
-                        product_name=st.session_state.current_product_info['name'],
-                        batch_number=st.session_state.current_product_info['batch_number'],
-                        quality=detection['quality'],
-                        confidence=detection['confidence'],
-                        timestamp=timestamp
+                records.extend(
+                    (product_id, product_name, batch_number, quality, confidence, None, timestamp)
+                    for product_id, quality, confidence in zip(
+                        detections['ids'].tolist(),
+                        qualities.astype(str).tolist(),
+                        detections['confidences'].tolist()
                     )
-            
-            # Calculate processing FPS
-            processing_time = time.time() - start_time
-            st.session_state.processing_fps = 1.0 / processing_time if processing_time > 0 else 0
-            
-            # Display the processed frame
-            video_container.image(processed_frame, channels="BGR", use_column_width=True)
-        else:
-            # Just display a placeholder when not active
-            frame = get_demo_frame(show_detection=False)
-            video_container.image(frame, channels="BGR", use_column_width=True)
+                )
         
-        # Sleep to simulate real-time processing
-        time.sleep(0.1)
+        # Record all detections of the drained results at once
+        if records:
+            inspection_db.add_inspection_records(st.session_state.session_id, records)
+        
+        inspection_db.flush_if_due()
+        st.session_state.processing_fps = pipeline.get_fps()
+    
+    # Update metrics with current counts
+    total_count_metric.metric("Total Products", st.session_state.product_count['total'])
+    good_count_metric.metric("Good Products", st.session_state.product_count['good'])
+    bad_count_metric.metric("Defective Products", st.session_state.product_count['bad'])
+    processing_speed_metric.metric("Processing Speed", f"{st.session_state.processing_fps:.1f} FPS")
+    
+    if st.session_state.inspection_active:
+        # Display the most recent processed frame, if a new one is ready
+        if processed_frame is not None:
+            video_container.image(encode_frame(processed_frame), use_column_width=True)
+    else:
+        # Just display a placeholder when not active
+        frame = get_demo_frame(show_detection=False)
+        video_container.image(encode_frame(frame), use_column_width=True)
+
+if camera_source == "Demo Video":
+    # Demo mode using a sample video
+    video_tick()
 else:
     # For actual camera feed (would be implemented in a production system)
     st.warning("Live camera feed not available in this environment. Using demo mode.")
@@ -1,8 +1,5 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import time
 import numpy as np
@@ -11,7 +8,7 @@ import numpy as np
 import sys
 import os
 sys.path.append(os.path.abspath("."))
-from utils.database import InspectionDatabase
+from utils.database import get_db
 
 # Set page configuration
 st.set_page_config(
@@ -21,9 +18,26 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize session state variables if they don't exist
-if 'inspection_db' not in st.session_state:
-    st.session_state.inspection_db = InspectionDatabase()
+# Database shared by all sessions and pages
+inspection_db = get_db()
+
+# Cached database queries, so reruns triggered by the filters don't hit the
+# database again. db_key identifies the database and its data version.
+@st.cache_data(ttl=5)
+def _sessions(_inspection_db, db_key):
+    # Parse and sort timestamps once per data version, so the date range
+    # can be selected with searchsorted
+    summaries = _inspection_db.get_session_summaries()
+    summaries['timestamp'] = pd.to_datetime(summaries['timestamp'])
+    return summaries.sort_values('timestamp', ignore_index=True)
+
+@st.cache_data(ttl=5)
+def _records(_inspection_db, db_key, start, end):
+    return _inspection_db.get_inspection_records_df(start=start, end=end)
+
+@st.cache_data(ttl=5)
+def _stats(_inspection_db, db_key, start, end):
+    return _inspection_db.get_statistics(start=start, end=end)
 
 # Page title
 st.title("Quality Inspection Dashboard")
@@ -43,24 +57,21 @@ start_datetime = datetime.combine(start_date, datetime.min.time())
 end_datetime = datetime.combine(end_date, datetime.max.time())
 
 # Get data from database
-session_summaries = st.session_state.inspection_db.get_session_summaries()
-inspection_records = st.session_state.inspection_db.get_inspection_records_df()
-overall_stats = st.session_state.inspection_db.get_statistics()
+db_key = (id(inspection_db), inspection_db.current_version())
+session_summaries = _sessions(inspection_db, db_key)
+inspection_records = _records(inspection_db, db_key, start_datetime, end_datetime)
+overall_stats = _stats(inspection_db, db_key, start_datetime, end_datetime)
 
 # Filter data based on date range
 if not session_summaries.empty:
-    session_summaries['timestamp'] = pd.to_datetime(session_summaries['timestamp'])
-    session_summaries = session_summaries[
-        (session_summaries['timestamp'] >= start_datetime) & 
-        (session_summaries['timestamp'] <= end_datetime)
-    ]
+    first, last = session_summaries['timestamp'].searchsorted(
+        [pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1)]
+    )
+    session_summaries = session_summaries.iloc[first:last]
 
+# Inspection records are already filtered by the database query
 if not inspection_records.empty:
     inspection_records['timestamp'] = pd.to_datetime(inspection_records['timestamp'])
-    inspection_records = inspection_records[
-        (inspection_records['timestamp'] >= start_datetime) & 
-        (inspection_records['timestamp'] <= end_datetime)
-    ]
 
 # Create dashboard layout
 col1, col2, col3 = st.columns(3)
@@ -87,6 +98,8 @@ chart_col1, chart_col2 = st.columns(2)
 with chart_col1:
     # Quality distribution pie chart
     if overall_stats['total_inspections'] > 0:
+        import plotly.graph_objects as go
+        
         fig_pie = go.Figure(data=[go.Pie(
             labels=['Good Products', 'Defective Products'],
             values=[overall_stats['good_count'], overall_stats['bad_count']],
@@ -101,30 +114,24 @@ with chart_col1:
 with chart_col2:
     # Inspection timeline
     if not inspection_records.empty:
-        # Group data by hour and quality status
-        inspection_records['hour'] = inspection_records['timestamp'].dt.floor('H')
-        timeline_data = inspection_records.groupby(['hour', 'quality']).size().reset_index(name='count')
+        import plotly.express as px
+        
+        # Count inspections per hour and quality status in a single pass
+        pivot_data = pd.crosstab(
+            inspection_records['timestamp'].dt.floor('h').rename('hour'),
+            inspection_records['quality']
+        ).reindex(columns=['good', 'bad'], fill_value=0).rename_axis(columns=None)
         
-        # Create timeline chart
-        if not timeline_data.empty:
-            pivot_data = timeline_data.pivot(index='hour', columns='quality', values='count').fillna(0)
-            if 'good' not in pivot_data.columns:
-                pivot_data['good'] = 0
-            if 'bad' not in pivot_data.columns:
-                pivot_data['bad'] = 0
-                
-            # Create figure
-            fig_timeline = px.line(
-                pivot_data.reset_index(),
-                x='hour',
-                y=['good', 'bad'],
-                labels={'hour': 'Time', 'value': 'Count', 'variable': 'Quality'},
-                color_discrete_map={'good': '#4CAF50', 'bad': '#F44336'}
-            )
-            fig_timeline.update_layout(title_text="Inspection Timeline", height=400)
-            st.plotly_chart(fig_timeline, use_container_width=True)
-        else:
-            st.info("No inspection data available for timeline chart")
+        # Create figure
+        fig_timeline = px.line(
+            pivot_data.reset_index(),
+            x='hour',
+            y=['good', 'bad'],
+            labels={'hour': 'Time', 'value': 'Count', 'variable': 'Quality'},
+            color_discrete_map={'good': '#4CAF50', 'bad': '#F44336'}
+        )
+        fig_timeline.update_layout(title_text="Inspection Timeline", height=400)
+        st.plotly_chart(fig_timeline, use_container_width=True)
     else:
         st.info("No inspection data available for timeline chart")
 
@@ -132,12 +139,15 @@ with chart_col2:
 st.subheader("Recent Inspection Sessions")
 
 if not session_summaries.empty:
-    # Display recent sessions in a table
+    # Display the 10 most recent sessions, labelled and formatted by the frontend
+    recent_sessions = session_summaries.nlargest(10, 'timestamp')[
+        ['timestamp', 'product_name', 'batch_number', 'total_products',
+         'good_products', 'defective_products', 'duration', 'avg_rate']
+    ]
     st.dataframe(
-        session_summaries[['timestamp', 'product_name', 'batch_number', 'total_products', 
-                          'good_products', 'defective_products', 'duration', 'avg_rate']]
-        .rename(columns={
-            'timestamp': 'Date & Time',
+        recent_sessions,
+        column_config={
+            'timestamp': st.column_config.DatetimeColumn('Date & Time'),
             'product_name': 'Product',
             'batch_number': 'Batch',
             'total_products': 'Total',
@@ -145,9 +155,7 @@ if not session_summaries.empty:
             'defective_products': 'Defective',
             'duration': 'Duration (s)',
             'avg_rate': 'Rate (units/min)'
-        })
-        .sort_values('Date & Time', ascending=False)
-        .head(10)
+        }
     )
 else:
     st.info("No recent inspection sessions to display")
@@ -156,16 +164,20 @@ else:
 st.subheader("Batch Performance Comparison")
 
 if not session_summaries.empty and len(session_summaries['batch_number'].unique()) > 1:
-    # Group by batch and aggregate metrics
-    batch_metrics = session_summaries.groupby('batch_number').agg({
-        'total_products': 'sum',
-        'good_products': 'sum',
-        'defective_products': 'sum',
-        'avg_rate': 'mean'
-    }).reset_index()
+    import plotly.express as px
     
-    # Calculate defect rate
-    batch_metrics['defect_rate'] = (batch_metrics['defective_products'] / batch_metrics['total_products'] * 100).round(2)
+    # Group by batch, aggregate metrics and calculate defect rate
+    batch_metrics = (
+        session_summaries.groupby('batch_number', sort=False)
+        .agg(
+            total_products=('total_products', 'sum'),
+            good_products=('good_products', 'sum'),
+            defective_products=('defective_products', 'sum'),
+            avg_rate=('avg_rate', 'mean')
+        )
+        .assign(defect_rate=lambda d: (d['defective_products'] / d['total_products'] * 100).round(2))
+        .reset_index()
+    )
     
     # Create comparison chart
     fig_batch = px.bar(
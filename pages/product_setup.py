@@ -7,7 +7,7 @@ import os
 
 # Import our custom modules
 sys.path.append(os.path.abspath("."))
-from utils.database import InspectionDatabase
+from utils.database import get_db
 
 # Set page configuration
 st.set_page_config(
@@ -17,10 +17,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Database shared by all sessions and pages
+inspection_db = get_db()
+
 # Initialize session state variables if they don't exist
-if 'inspection_db' not in st.session_state:
-    st.session_state.inspection_db = InspectionDatabase()
-    
 if 'current_product_info' not in st.session_state:
     st.session_state.current_product_info = {
         'name': 'Default Product',
@@ -38,6 +38,20 @@ if 'edit_mode' not in st.session_state:
 if 'edit_index' not in st.session_state:
     st.session_state.edit_index = None
 
+# Default inspection criteria per criteria tab, keyed by widget key prefix
+DEFECT_TYPES = ["Dents", "Scratches", "Color", "Shape", "Label Alignment", "Caps"]
+CRITERIA = {
+    'std': dict(label="Standard", threshold=0.5, min_size=20,
+                defects=["Dents", "Scratches", "Label Alignment", "Caps"],
+                bad=0.3, good=0.7, log_all=True, stop=False),
+    'strict': dict(label="Strict", threshold=0.3, min_size=10,
+                   defects=DEFECT_TYPES,
+                   bad=0.4, good=0.8, log_all=True, stop=True),
+    'permissive': dict(label="Permissive", threshold=0.7, min_size=30,
+                       defects=["Dents", "Label Alignment"],
+                       bad=0.2, good=0.6, log_all=False, stop=False),
+}
+
 # Function to add new product
 def add_product(name, description, company, batch_number, criteria):
     new_product = {
@@ -58,7 +72,7 @@ def add_product(name, description, company, batch_number, criteria):
         st.session_state.products.append(new_product)
     
     # Add to database
-    product_id = st.session_state.inspection_db.add_product(
+    product_id = inspection_db.add_product(
         name=name,
         description=description,
         company=company
@@ -97,6 +111,12 @@ st.title("Product Setup")
 tab1, tab2 = st.tabs(["Add/Edit Products", "Inspection Criteria"])
 
 with tab1:
+    # Read session state once for this tab
+    ss = st.session_state
+    edit_mode = ss.edit_mode
+    edit_index = ss.edit_index
+    products = ss.products
+    
     # Create two columns for the form and list
     col1, col2 = st.columns([1, 1])
     
@@ -105,8 +125,8 @@ with tab1:
         
         # Get product to edit if in edit mode
         edit_product_data = None
-        if st.session_state.edit_mode and st.session_state.edit_index is not None:
-            edit_product_data = st.session_state.products[st.session_state.edit_index]
+        if edit_mode and edit_index is not None:
+            edit_product_data = products[edit_index]
         
         # Create the product form
         with st.form("product_form"):
@@ -137,7 +157,7 @@ with tab1:
             )
             
             submit_button = st.form_submit_button(
-                "Update Product" if st.session_state.edit_mode else "Add Product"
+                "Update Product" if edit_mode else "Add Product"
             )
             
             if submit_button:
@@ -156,10 +176,10 @@ with tab1:
         st.subheader("Product List")
         
         # Display existing products
-        if not st.session_state.products:
+        if not products:
             st.info("No products added yet. Use the form to add a new product.")
         else:
-            for i, product in enumerate(st.session_state.products):
+            for i, product in enumerate(products):
                 with st.expander(f"{product['name']} (Batch: {product['batch_number']})"):
                     st.write(f"**Description:** {product['description']}")
                     st.write(f"**Company:** {product['company']}")
@@ -183,76 +203,31 @@ with tab2:
     st.subheader("Inspection Criteria Configuration")
     
     # Create tabs for different criteria types
-    criteria_tab1, criteria_tab2, criteria_tab3 = st.tabs(["Standard", "Strict", "Permissive"])
+    criteria_tabs = st.tabs([cfg['label'] for cfg in CRITERIA.values()])
     
-    with criteria_tab1:
-        st.write("### Standard Inspection Criteria")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write("**Defect Detection Settings:**")
-            st.slider("Detection Threshold", 0.0, 1.0, 0.5, 0.05, key="std_threshold")
-            st.slider("Minimum Defect Size (px)", 1, 100, 20, 1, key="std_min_size")
-            st.multiselect(
-                "Defect Types to Check",
-                ["Dents", "Scratches", "Color", "Shape", "Label Alignment", "Caps"],
-                ["Dents", "Scratches", "Label Alignment", "Caps"],
-                key="std_defect_types"
-            )
-        
-        with col2:
-            st.write("**Quality Thresholds:**")
-            st.slider("Bad Quality Threshold", 0.0, 1.0, 0.3, 0.05, key="std_bad_thresh")
-            st.slider("Good Quality Threshold", 0.0, 1.0, 0.7, 0.05, key="std_good_thresh")
-            st.checkbox("Log All Inspections", value=True, key="std_log_all")
-            st.checkbox("Stop Line on Critical Defects", value=False, key="std_stop_line")
-    
-    with criteria_tab2:
-        st.write("### Strict Inspection Criteria")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write("**Defect Detection Settings:**")
-            st.slider("Detection Threshold", 0.0, 1.0, 0.3, 0.05, key="strict_threshold")
-            st.slider("Minimum Defect Size (px)", 1, 100, 10, 1, key="strict_min_size")
-            st.multiselect(
-                "Defect Types to Check",
-                ["Dents", "Scratches", "Color", "Shape", "Label Alignment", "Caps"],
-                ["Dents", "Scratches", "Color", "Shape", "Label Alignment", "Caps"],
-                key="strict_defect_types"
-            )
-        
-        with col2:
-            st.write("**Quality Thresholds:**")
-            st.slider("Bad Quality Threshold", 0.0, 1.0, 0.4, 0.05, key="strict_bad_thresh")
-            st.slider("Good Quality Threshold", 0.0, 1.0, 0.8, 0.05, key="strict_good_thresh")
-            st.checkbox("Log All Inspections", value=True, key="strict_log_all")
-            st.checkbox("Stop Line on Critical Defects", value=True, key="strict_stop_line")
-    
-    with criteria_tab3:
-        st.write("### Permissive Inspection Criteria")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write("**Defect Detection Settings:**")
-            st.slider("Detection Threshold", 0.0, 1.0, 0.7, 0.05, key="permissive_threshold")
-            st.slider("Minimum Defect Size (px)", 1, 100, 30, 1, key="permissive_min_size")
-            st.multiselect(
-                "Defect Types to Check",
-                ["Dents", "Scratches", "Color", "Shape", "Label Alignment", "Caps"],
-                ["Dents", "Label Alignment"],
-                key="permissive_defect_types"
-            )
-        
-        with col2:
-            st.write("**Quality Thresholds:**")
-            st.slider("Bad Quality Threshold", 0.0, 1.0, 0.2, 0.05, key="permissive_bad_thresh")
-            st.slider("Good Quality Threshold", 0.0, 1.0, 0.6, 0.05, key="permissive_good_thresh")
-            st.checkbox("Log All Inspections", value=False, key="permissive_log_all")
-            st.checkbox("Stop Line on Critical Defects", value=False, key="permissive_stop_line")
+    for tab, (key, cfg) in zip(criteria_tabs, CRITERIA.items()):
+        with tab:
+            st.write(f"### {cfg['label']} Inspection Criteria")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.write("**Defect Detection Settings:**")
+                st.slider("Detection Threshold", 0.0, 1.0, cfg['threshold'], 0.05, key=f"{key}_threshold")
+                st.slider("Minimum Defect Size (px)", 1, 100, cfg['min_size'], 1, key=f"{key}_min_size")
+                st.multiselect(
+                    "Defect Types to Check",
+                    DEFECT_TYPES,
+                    cfg['defects'],
+                    key=f"{key}_defect_types"
+                )
+            
+            with col2:
+                st.write("**Quality Thresholds:**")
+                st.slider("Bad Quality Threshold", 0.0, 1.0, cfg['bad'], 0.05, key=f"{key}_bad_thresh")
+                st.slider("Good Quality Threshold", 0.0, 1.0, cfg['good'], 0.05, key=f"{key}_good_thresh")
+                st.checkbox("Log All Inspections", value=cfg['log_all'], key=f"{key}_log_all")
+                st.checkbox("Stop Line on Critical Defects", value=cfg['stop'], key=f"{key}_stop_line")
     
     # Save criteria button
     if st.button("Save Criteria Configuration", type="primary"):
@@ -1,17 +1,22 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 import io
-import base64
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import time
 import sys
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow is optional, fall back to the pandas CSV writer
+    pa = None
 
 # Import our custom modules
 sys.path.append(os.path.abspath("."))
-from utils.database import InspectionDatabase
-from utils.reporting import generate_pdf_report, generate_excel_report
+from utils.database import get_db
 
 # Set page configuration
 st.set_page_config(
@@ -21,10 +26,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Database shared by all sessions and pages
+inspection_db = get_db()
+
 # Initialize session state variables if they don't exist
-if 'inspection_db' not in st.session_state:
-    st.session_state.inspection_db = InspectionDatabase()
-    
 if 'current_product_info' not in st.session_state:
     st.session_state.current_product_info = {
         'name': 'Default Product',
@@ -36,50 +41,90 @@ if 'current_product_info' not in st.session_state:
 if 'product_count' not in st.session_state:
     st.session_state.product_count = {'total': 0, 'good': 0, 'bad': 0}
 
-# Function to create a download link
-def get_download_link(buffer, file_name, link_text):
-    """
-    Create a download link for a file
-    
-    Args:
-        buffer: BytesIO buffer containing the file
-        file_name: Name of the file to download
-        link_text: Text to display for the download link
-        
-    Returns:
-        HTML string with the download link
-    """
-    b64 = base64.b64encode(buffer.getvalue()).decode()
-    href = f'<a href="data:application/octet-stream;base64,{b64}" download="{file_name}">{link_text}</a>'
-    return href
+# MIME types of the downloadable reports
+PDF_MIME = "application/pdf"
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Maximum number of records per chunk of a raw data export
+EXPORT_CHUNK_SIZE = 50000
+
+# Maximum number of records shown in the records view
+RECORDS_VIEW_LIMIT = 1000
 
-# Function to generate reports
-def generate_report(report_type, report_period=None, batch_number=None):
+# Maximum number of processes building reports at the same time
+REPORT_WORKERS = 4
+
+# Worker processes shared by all sessions, so building a report neither
+# holds the GIL of the server nor waits for other sessions' reports. They
+# are started from a fork server rather than forked from the multithreaded
+# Streamlit server.
+@st.cache_resource
+def _report_pool():
+    return ProcessPoolExecutor(
+        max_workers=min(REPORT_WORKERS, os.cpu_count() or 1),
+        mp_context=multiprocessing.get_context("forkserver")
+    )
+
+# Cached record queries, so reruns and the report tabs don't hit the database
+# again. db_key identifies the database and its data version. The page only
+# loads the records it shows, at most RECORDS_VIEW_LIMIT of them.
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_records_view(_inspection_db, db_key, qualities, product_name, batch_number):
+    records = _inspection_db.get_inspection_records_df(
+        batch_number=batch_number, limit=RECORDS_VIEW_LIMIT,
+        product_name=product_name, qualities=qualities
+    )
+    counts = _inspection_db.get_counts(batch_number=batch_number, product_name=product_name)
+    return records, counts
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_counts(_inspection_db, db_key):
+    return _inspection_db.get_counts()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_records_preview(_inspection_db, db_key):
+    return _inspection_db.get_inspection_records_df(limit=5)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _load_batches(_inspection_db, db_key):
+    return _inspection_db.distinct_batches()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _load_products(_inspection_db, db_key):
+    return _inspection_db.distinct_products()
+
+# Function to generate reports, cached so the same report is only built once
+# per data version. A cached report keeps the time it was built at.
+@st.cache_data(ttl=300, max_entries=10, show_spinner=False)
+def generate_report(db_key, report_type, report_date, report_period=None, batch_number=None, product_info=None):
     """
     Generate a report based on the specified type and filters
     
     Args:
+        db_key: Identity and data version of the database
         report_type: Type of report to generate ('pdf' or 'excel')
+        report_date: Current date, which the report period is relative to
         report_period: Period for the report
         batch_number: Filter by batch number
+        product_info: Product information to include in the report
         
     Returns:
-        Generated report as BytesIO buffer
+        Generated report as bytes and its file name
     """
-    # Get inspection data
-    inspection_db = st.session_state.inspection_db
+    # Time the report is built at, shown in the report and its file name
+    generated_at = datetime.now().replace(microsecond=0)
     
     # Filter data based on period if needed
     if report_period == "daily":
-        today = datetime.now().date()
+        today = report_date
         start_date = datetime.combine(today, datetime.min.time())
         end_date = datetime.combine(today, datetime.max.time())
     elif report_period == "weekly":
-        today = datetime.now().date()
+        today = report_date
         start_date = datetime.combine(today - timedelta(days=today.weekday()), datetime.min.time())
         end_date = datetime.combine(start_date.date() + timedelta(days=6), datetime.max.time())
     elif report_period == "monthly":
-        today = datetime.now().date()
+        today = report_date
         start_date = datetime.combine(today.replace(day=1), datetime.min.time())
         # End date is the last day of the month
         next_month = today.replace(day=28) + timedelta(days=4)
@@ -89,48 +134,50 @@ def generate_report(report_type, report_period=None, batch_number=None):
         start_date = None
         end_date = None
     
-    # Get records with filters
-    if batch_number:
-        # Filter by batch number
-        records = inspection_db.get_inspection_records_df()
-        records = records[records['batch_number'] == batch_number]
-    else:
-        # Get all records
-        records = inspection_db.get_inspection_records_df()
+    # Count products with the batch and date filters applied by the database
+    product_count = inspection_db.get_counts(start=start_date, end=end_date, batch_number=batch_number)
     
-    # Further filter by date range if needed
-    if start_date and end_date and not records.empty:
-        records['timestamp'] = pd.to_datetime(records['timestamp'])
-        records = records[(records['timestamp'] >= start_date) & (records['timestamp'] <= end_date)]
+    # Import the report builders only once a report is requested
+    from utils.reporting import build_pdf_report, build_excel_report, PDF_RECORDS_LIMIT
     
-    # Create product counts
-    product_count = {
-        'total': len(records) if not records.empty else 0,
-        'good': len(records[records['quality'] == 'good']) if not records.empty else 0,
-        'bad': len(records[records['quality'] == 'bad']) if not records.empty else 0
-    }
-    
-    # Generate the appropriate report
+    # Build the appropriate report in a worker process, passing the
+    # records by value since the database connection can't be shared.
+    # The PDF only lists the most recent records, so only those are loaded.
     if report_type == 'pdf':
-        report = generate_pdf_report(
-            inspection_db,
+        records = inspection_db.get_inspection_records_df(
+            batch_number=batch_number, start=start_date, end=end_date, limit=PDF_RECORDS_LIMIT
+        )
+        future = _report_pool().submit(
+            build_pdf_report,
+            records,
             product_count,
-            st.session_state.current_product_info
+            product_info,
+            generated_at
         )
-        file_name = f"inspection_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        file_name = f"inspection_report_{generated_at.strftime('%Y%m%d_%H%M%S')}.pdf"
     else:  # Excel
-        report = generate_excel_report(
-            inspection_db,
+        records = inspection_db.get_inspection_records_df(
+            batch_number=batch_number, start=start_date, end=end_date
+        )
+        future = _report_pool().submit(
+            build_excel_report,
+            records,
             product_count,
-            st.session_state.current_product_info
+            product_info,
+            generated_at
         )
-        file_name = f"inspection_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        file_name = f"inspection_report_{generated_at.strftime('%Y%m%d_%H%M%S')}.xlsx"
     
-    return report, file_name
+    return future.result().getvalue(), file_name
 
 # Page title
 st.title("Inspection Reports")
 
+# Get the batches and products once and share them between the tabs
+db_key = (id(inspection_db), inspection_db.current_version())
+batches = _load_batches(inspection_db, db_key)
+products = _load_products(inspection_db, db_key)
+
 # Create tabs for different report types
 tab1, tab2, tab3 = st.tabs(["Generate Reports", "View Records", "Export Data"])
 
@@ -153,9 +200,8 @@ with tab1:
             index=0
         )
         
-        # Get available batch numbers from database
-        records_df = st.session_state.inspection_db.get_inspection_records_df()
-        batch_numbers = ["All Batches"] + sorted(list(records_df['batch_number'].unique())) if not records_df.empty else ["All Batches"]
+        # Get available batch numbers
+        batch_numbers = ["All Batches"] + batches
         
         batch_filter = st.selectbox(
             "Filter by Batch",
@@ -172,15 +218,19 @@ with tab1:
                 batch = batch_filter if batch_filter != "All Batches" else None
                 
                 # Generate the report
-                report_buffer, file_name = generate_report(r_type, r_period, batch)
+                report_data, file_name = generate_report(
+                    db_key, r_type, date.today(),
+                    r_period, batch, st.session_state.current_product_info
+                )
                 
-                # Create download link
-                link_text = "Download Report"
-                download_link = get_download_link(report_buffer, file_name, link_text)
-                
-                # Display download link
+                # Display download button
                 st.success("Report generated successfully!")
-                st.markdown(download_link, unsafe_allow_html=True)
+                st.download_button(
+                    "Download Report",
+                    data=report_data,
+                    file_name=file_name,
+                    mime=PDF_MIME if r_type == 'pdf' else EXCEL_MIME
+                )
     
     with col2:
         st.subheader("Report Preview")
@@ -200,13 +250,21 @@ with tab1:
         st.write("**Current Product:**", st.session_state.current_product_info['name'])
         st.write("**Current Batch:**", st.session_state.current_product_info['batch_number'])
 
-with tab2:
-    st.subheader("Inspection Records")
+# Records view as a fragment, so changing its filters only reruns this view
+@st.fragment
+def records_view(db_key, products, batches):
+    """
+    Show the most recent inspection records with quality, product and batch
+    filters, which are applied by the database
     
-    # Get records from database
-    records_df = st.session_state.inspection_db.get_inspection_records_df()
+    Args:
+        db_key: Identity and data version of the database
+        products: Sorted product names to filter by
+        batches: Sorted batch numbers to filter by
+    """
+    st.subheader("Inspection Records")
     
-    if records_df.empty:
+    if _load_counts(inspection_db, db_key)['total'] == 0:
         st.info("No inspection records available yet. Run inspections to generate data.")
     else:
         # Add filters
@@ -216,38 +274,37 @@ with tab2:
             quality_filter = st.multiselect(
                 "Filter by Quality",
                 options=["good", "bad"],
-                default=["good", "bad"]
+                default=["good", "bad"],
+                key="records_quality_filter"
             )
         
         with col2:
             # Get unique product names
-            product_names = ["All Products"] + sorted(list(records_df['product_name'].unique()))
+            product_names = ["All Products"] + products
             product_filter = st.selectbox(
                 "Filter by Product",
                 options=product_names,
-                index=0
+                index=0,
+                key="records_product_filter"
             )
         
         with col3:
             # Get unique batch numbers
-            batch_numbers = ["All Batches"] + sorted(list(records_df['batch_number'].unique()))
+            batch_numbers = ["All Batches"] + batches
             batch_filter = st.selectbox(
                 "Filter by Batch",
                 options=batch_numbers,
-                index=0
+                index=0,
+                key="records_batch_filter"
             )
         
-        # Apply filters
-        filtered_df = records_df.copy()
-        
-        if quality_filter:
-            filtered_df = filtered_df[filtered_df['quality'].isin(quality_filter)]
-            
-        if product_filter != "All Products":
-            filtered_df = filtered_df[filtered_df['product_name'] == product_filter]
-            
-        if batch_filter != "All Batches":
-            filtered_df = filtered_df[filtered_df['batch_number'] == batch_filter]
+        # Load the filtered records and their counts
+        filtered_df, counts = _load_records_view(
+            inspection_db, db_key,
+            tuple(quality_filter) or None,
+            product_filter if product_filter != "All Products" else None,
+            batch_filter if batch_filter != "All Batches" else None
+        )
         
         # Display filtered records
         if filtered_df.empty:
@@ -280,24 +337,33 @@ with tab2:
                 hide_index=True
             )
             
+            # Only count the selected qualities
+            good_count = counts['good'] if 'good' in quality_filter or not quality_filter else 0
+            bad_count = counts['bad'] if 'bad' in quality_filter or not quality_filter else 0
+            total_count = good_count + bad_count
+            
+            if total_count > len(filtered_df):
+                st.caption(f"Showing the {len(filtered_df)} most recent of {total_count} records.")
+            
             # Show summary statistics
             st.subheader("Summary Statistics")
             
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                st.metric("Total Records", len(filtered_df))
+                st.metric("Total Records", total_count)
             
             with col2:
-                good_count = len(filtered_df[filtered_df['quality'] == 'good'])
-                good_percentage = (good_count / len(filtered_df) * 100) if len(filtered_df) > 0 else 0
+                good_percentage = (good_count / total_count * 100) if total_count > 0 else 0
                 st.metric("Good Products", f"{good_count} ({good_percentage:.1f}%)")
             
             with col3:
-                bad_count = len(filtered_df[filtered_df['quality'] == 'bad'])
-                bad_percentage = (bad_count / len(filtered_df) * 100) if len(filtered_df) > 0 else 0
+                bad_percentage = (bad_count / total_count * 100) if total_count > 0 else 0
                 st.metric("Defective Products", f"{bad_count} ({bad_percentage:.1f}%)")
 
+with tab2:
+    records_view(db_key, products, batches)
+
 with tab3:
     st.subheader("Export Raw Data")
     
@@ -308,12 +374,16 @@ with tab3:
         horizontal=True
     )
     
-    # Get the selected data
+    # Get the selected data. Inspection records are exported in chunks
+    # streamed from the database and only their first rows are loaded for the
+    # preview, so the page doesn't hold the whole table.
     if data_type == "Inspection Records":
-        export_df = st.session_state.inspection_db.get_inspection_records_df()
+        export_df = _load_records_preview(inspection_db, db_key)
+        export_chunks = lambda: inspection_db.iter_inspection_records_df(chunksize=EXPORT_CHUNK_SIZE)
         file_prefix = "inspection_records"
     else:
-        export_df = st.session_state.inspection_db.get_session_summaries()
+        export_df = inspection_db.get_session_summaries()
+        export_chunks = lambda: [export_df]
         file_prefix = "session_summaries"
     
     # Check if data exists
@@ -332,33 +402,52 @@ with tab3:
             if st.button("Export to Excel"):
                 # Generate Excel file
                 excel_buffer = io.BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                    export_df.to_excel(writer, index=False)
+                with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+                    start_row = 0
+                    for chunk in export_chunks():
+                        chunk.to_excel(writer, startrow=start_row, header=start_row == 0, index=False)
+                        start_row += len(chunk) + (start_row == 0)
                 
                 excel_buffer.seek(0)
                 
-                # Create download link
+                # Create download button
                 file_name = f"{file_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                download_link = get_download_link(excel_buffer, file_name, "Download Excel File")
                 
                 st.success("Excel file generated!")
-                st.markdown(download_link, unsafe_allow_html=True)
+                st.download_button(
+                    "Download Excel File",
+                    data=excel_buffer.getvalue(),
+                    file_name=file_name,
+                    mime=EXCEL_MIME
+                )
         
         with col2:
             # CSV export
             if st.button("Export to CSV"):
                 # Generate CSV file
                 csv_buffer = io.BytesIO()
-                export_df.to_csv(csv_buffer, index=False)
+                for i, chunk in enumerate(export_chunks()):
+                    if pa is not None:
+                        pa_csv.write_csv(
+                            pa.Table.from_pandas(chunk, preserve_index=False),
+                            csv_buffer,
+                            write_options=pa_csv.WriteOptions(include_header=i == 0)
+                        )
+                    else:
+                        chunk.to_csv(csv_buffer, header=i == 0, index=False, lineterminator="\n")
                 
                 csv_buffer.seek(0)
                 
-                # Create download link
+                # Create download button
                 file_name = f"{file_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                download_link = get_download_link(csv_buffer, file_name, "Download CSV File")
                 
                 st.success("CSV file generated!")
-                st.markdown(download_link, unsafe_allow_html=True)
+                st.download_button(
+                    "Download CSV File",
+                    data=csv_buffer.getvalue(),
+                    file_name=file_name,
+                    mime="text/csv"
+                )
 
 # Navigation button to return to main inspection page
 st.sidebar.header("Report Options")
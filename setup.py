@@ -11,7 +11,8 @@ setup(
         "pandas",
         "matplotlib",
         "plotly",
-        "fpdf",
+        "fpdf2",
+        "xlsxwriter",
     ],
     author="LiveupX",
     author_email="contact@example.com",
@@ -0,0 +1,45 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, fall back to NumPy array operations
+    njit = None
+
+def _alpha_over_numpy(roi, fg):
+    """
+    Blend an image with premultiplied alpha over a region in place
+    Args:
+        roi: uint8 BGR region of the frame, shape (H, W, 3)
+        fg: uint8 BGRA image with premultiplied alpha, shape (H, W, 4)
+    """
+    # The shifts round the division by 255 without dividing, and leave the
+    # region unchanged where the image is transparent
+    background = roi * (255 - fg[:,:,3:4].astype(np.uint16))
+    roi[:] = fg[:,:,:3] + ((background + (background >> 8) + 128) >> 8)
+
+def _alpha_over_kernel(roi, fg):
+    """
+    Blend an image with premultiplied alpha over a region in place,
+    in a single pass over the pixels
+    Args:
+        roi: uint8 BGR region of the frame, shape (H, W, 3)
+        fg: uint8 BGRA image with premultiplied alpha, shape (H, W, 4)
+    """
+    for y in range(roi.shape[0]):
+        for x in range(roi.shape[1]):
+            inv = np.uint16(255 - fg[y, x, 3])
+            for c in range(3):
+                background = roi[y, x, c] * inv
+                roi[y, x, c] = fg[y, x, c] + ((background + (background >> 8) + 128) >> 8)
+
+if njit is not None:
+    alpha_over = njit(cache=True)(_alpha_over_kernel)
+    # Compile up front so the first demo frame isn't delayed, for the
+    # argument types the demo frames use: a region sliced out of the frame
+    # and a read-only sprite
+    _sprite = np.zeros((1, 1, 4), dtype=np.uint8)
+    _sprite.flags.writeable = False
+    alpha_over(np.zeros((2, 2, 3), dtype=np.uint8)[:, :1], _sprite)
+    del _sprite
+else:
+    alpha_over = _alpha_over_numpy
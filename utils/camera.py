@@ -1,8 +1,9 @@
 import cv2
 import numpy as np
 import time
+import queue
 import streamlit as st
-from threading import Thread
+from threading import Thread, Lock
 
 class VideoCapture:
     """
@@ -16,10 +17,16 @@ class VideoCapture:
             source: Camera index or video file path
         """
         self.source = source
+        self._is_file = isinstance(source, str)
         self.cap = None
         self.thread = None
         self.stopped = False
         self.frame = None
+        self.frame_lock = Lock()
+        # Frames are decoded alternately into two reused buffers
+        self._buffers = [None, None]
+        self._buffer_index = 0
+        self.frame_period = 0
         self.last_frame_time = 0
         self.fps = 0
         
@@ -32,6 +39,14 @@ class VideoCapture:
         # Set camera properties
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        # Keep only the newest frame in the driver queue
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        # Cameras block in read() until the next frame arrives, video files
+        # have to be paced to their own frame rate
+        if self._is_file:
+            file_fps = self.cap.get(cv2.CAP_PROP_FPS)
+            self.frame_period = 1 / file_fps if file_fps > 0 else 0
         
         # Start thread
         self.stopped = False
@@ -44,26 +59,41 @@ class VideoCapture:
         """Read frames continuously from the camera"""
         while not self.stopped:
             if self.cap is not None:
-                ret, frame = self.cap.read()
+                ret, frame = self.cap.read(self._buffers[self._buffer_index])
                 if ret:
-                    current_time = time.time()
+                    # read() allocates the buffer on first use or a size change
+                    self._buffers[self._buffer_index] = frame
+                    self._buffer_index ^= 1
+                    
+                    if self.frame_period:
+                        delay = self.last_frame_time + self.frame_period - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    
+                    current_time = time.perf_counter()
                     if self.last_frame_time > 0:
                         self.fps = 1 / (current_time - self.last_frame_time)
                     self.last_frame_time = current_time
                     
-                    self.frame = frame
+                    with self.frame_lock:
+                        self.frame = frame
                 else:
                     # If we reach the end of a video file, loop back
-                    if isinstance(self.source, str):
+                    if self._is_file:
                         self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
                     else:
                         self.stop()
                         break
-            time.sleep(0.01)  # Small delay to reduce CPU usage
     
     def read(self):
-        """Return the most recent frame"""
-        return self.frame
+        """
+        Return the most recent frame
+        
+        The frame buffer is reused for the frame after next, so copy it to
+        keep it for longer than that.
+        """
+        with self.frame_lock:
+            return self.frame
     
     def get_fps(self):
         """Return the fps of the video capture"""
@@ -80,3 +110,71 @@ class VideoCapture:
     def __del__(self):
         """Cleanup on object destruction"""
         self.stop()
+
+
+class ThreadedFrameSource:
+    """
+    Class to generate frames on a background thread, always keeping
+    only the most recent frame ready for the reader
+    """
+    def __init__(self, frame_func, frame_interval=0.0, idle_timeout=10.0):
+        """
+        Initialize the frame source
+        Args:
+            frame_func: Function returning a new frame on each call
+            frame_interval: Minimum time between generated frames in seconds
+            idle_timeout: Stop once no frame has been read for this many
+                seconds, e.g. after its reader was abandoned
+        """
+        self.frame_func = frame_func
+        self.frame_interval = frame_interval
+        self.idle_timeout = idle_timeout
+        self.thread = None
+        self._running = False
+        self._last_read_time = 0
+        self._q = queue.Queue(maxsize=1)
+        
+    def start(self):
+        """Start the frame generation thread"""
+        self._running = True
+        self._last_read_time = time.monotonic()
+        self.thread = Thread(target=self._update, args=())
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+    
+    def _update(self):
+        """Generate frames continuously, dropping any frame that was not read"""
+        while self._running:
+            if time.monotonic() - self._last_read_time > self.idle_timeout:
+                # Nobody is reading the frames anymore
+                self._running = False
+                break
+            frame = self.frame_func()
+            try:
+                self._q.get_nowait()
+            except queue.Empty:
+                pass
+            self._q.put(frame)
+            if self.frame_interval:
+                time.sleep(self.frame_interval)
+    
+    def read(self):
+        """Wait for and return the next frame, or None once stopped"""
+        self._last_read_time = time.monotonic()
+        while self._running:
+            try:
+                return self._q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+    
+    def stop(self):
+        """Stop the frame generation thread"""
+        self._running = False
+        if self.thread is not None:
+            self.thread.join()
+            
+    def __del__(self):
+        """Cleanup on object destruction"""
+        self.stop()
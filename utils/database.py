@@ -1,13 +1,49 @@
+import streamlit as st
 import pandas as pd
 import sqlite3
 import os
 import json
+import time
+import atexit
+import threading
+import weakref
 from datetime import datetime
 
+def _adapt_datetime(value):
+    """Store datetimes as fixed-width ISO-8601 text, which sorts chronologically"""
+    return value.isoformat(sep=' ', timespec='microseconds')
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+
+def _flush_on_exit(db_ref):
+    """Write out buffered records of a database that is still alive at exit"""
+    db = db_ref()
+    if db is not None:
+        db.flush()
+
 class InspectionDatabase:
     """
     Class to handle storage and retrieval of inspection data
     """
+    # Buffered inspection records are written once either limit is reached
+    FLUSH_SIZE = 64
+    FLUSH_INTERVAL = 0.5  # seconds
+    
+    # Statements used on every write, kept as constants so each call passes
+    # the same string and hits the connection's statement cache
+    INSERT_RECORD_SQL = """
+        INSERT INTO inspection_records 
+        (session_id, product_id, product_name, batch_number, quality, confidence, defects, timestamp) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    INSERT_SUMMARY_SQL = """
+        INSERT INTO session_summaries 
+        (session_id, timestamp, product_name, batch_number, company, 
+         total_products, good_products, defective_products, duration, avg_rate) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    END_SESSION_SQL = "UPDATE inspection_sessions SET end_time = ?, status = ? WHERE id = ?"
+    
     def __init__(self, db_path=":memory:"):
         """
         Initialize the database
@@ -15,9 +51,21 @@ class InspectionDatabase:
             db_path: Path to the database file, defaults to in-memory database
         """
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+        # Let readers work alongside the inspection loop's writes and
+        # avoid an fsync on every commit
+        self.conn.executescript(
+            "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; "
+            "PRAGMA temp_store=MEMORY; PRAGMA mmap_size=268435456;"
+        )
+        # The connection is shared between threads, so serialize access to it
+        self._lock = threading.RLock()
         self.create_tables()
-        self.current_session_id = None
+        
+        # Inspection records waiting to be written in a single transaction
+        self._pending = []
+        self._last_flush = time.monotonic()
+        atexit.register(_flush_on_exit, weakref.ref(self))
         
     def create_tables(self):
         """Create the necessary database tables if they don't exist"""
@@ -81,6 +129,21 @@ class InspectionDatabase:
         )
         ''')
         
+        # Index inspection records by time for date ranges and ordering,
+        # which SQLite can scan in either direction
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_records_ts ON inspection_records (timestamp)"
+        )
+        # Batch filters are usually combined with a date range or ordered by
+        # time, so index the batch together with the timestamp
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_records_batch_ts ON inspection_records (batch_number, timestamp)"
+        )
+        # Index product names for the distinct product list
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_records_product ON inspection_records (product_name)"
+        )
+        
         self.conn.commit()
     
     def add_product(self, name, description=None, company=None):
@@ -95,13 +158,14 @@ class InspectionDatabase:
         Returns:
             ID of the newly created product
         """
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "INSERT INTO products (name, description, company) VALUES (?, ?, ?)",
-            (name, description, company)
-        )
-        self.conn.commit()
-        return cursor.lastrowid
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "INSERT INTO products (name, description, company) VALUES (?, ?, ?)",
+                (name, description, company)
+            )
+            self.conn.commit()
+            return cursor.lastrowid
     
     def get_products(self):
         """
@@ -110,12 +174,17 @@ class InspectionDatabase:
         Returns:
             DataFrame with all products
         """
-        return pd.read_sql("SELECT * FROM products", self.conn)
+        with self._lock:
+            return pd.read_sql("SELECT * FROM products", self.conn)
     
     def start_new_session(self, product_name, batch_number):
         """
         Start a new inspection session
         
+        The database is shared between user sessions, so it doesn't keep
+        track of the current session. Callers pass the returned ID to the
+        methods that record data for the session.
+        
         Args:
             product_name: Name of the product being inspected
             batch_number: Batch number for the inspection
@@ -123,49 +192,54 @@ class InspectionDatabase:
         Returns:
             ID of the newly created session
         """
-        # Get or create product ID
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id FROM products WHERE name = ?", (product_name,))
-        result = cursor.fetchone()
-        
-        if result:
-            product_id = result[0]
-        else:
-            product_id = self.add_product(product_name)
-        
-        # Create new session
-        cursor.execute(
-            "INSERT INTO inspection_sessions (product_id, batch_number, start_time, status) VALUES (?, ?, ?, ?)",
-            (product_id, batch_number, datetime.now(), "active")
-        )
-        self.conn.commit()
-        
-        self.current_session_id = cursor.lastrowid
-        return self.current_session_id
+        with self._lock:
+            # Get or create product ID
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT id FROM products WHERE name = ?", (product_name,))
+            result = cursor.fetchone()
+            
+            if result:
+                product_id = result[0]
+            else:
+                product_id = self.add_product(product_name)
+            
+            # Create new session
+            cursor.execute(
+                "INSERT INTO inspection_sessions (product_id, batch_number, start_time, status) VALUES (?, ?, ?, ?)",
+                (product_id, batch_number, datetime.now(), "active")
+            )
+            self.conn.commit()
+            
+            return cursor.lastrowid
     
-    def end_session(self, session_id=None):
+    def end_session(self, session_id):
         """
         End an inspection session
         
         Args:
-            session_id: ID of the session to end, defaults to current session
+            session_id: ID of the session to end
         """
-        if session_id is None:
-            session_id = self.current_session_id
+        with self._lock:
+            # Write out buffered records before the session is closed
+            self.flush()
             
-        if session_id:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                "UPDATE inspection_sessions SET end_time = ?, status = ? WHERE id = ?",
-                (datetime.now(), "completed", session_id)
-            )
-            self.conn.commit()
+            if session_id:
+                cursor = self.conn.cursor()
+                cursor.execute(
+                    self.END_SESSION_SQL,
+                    (datetime.now(), "completed", session_id)
+                )
+                self.conn.commit()
     
-    def add_inspection_record(self, product_id, product_name, batch_number, quality, confidence, defects=None, timestamp=None):
+    def add_inspection_record(self, session_id, product_id, product_name, batch_number, quality, confidence, defects=None, timestamp=None):
         """
         Add a new inspection record
         
+        Records are buffered in memory and written to the database by
+        flush(), so adding a record does not cost a database round-trip.
+        
         Args:
+            session_id: ID of the inspection session the record belongs to
             product_id: ID of the inspected product
             product_name: Name of the product
             batch_number: Batch number
@@ -173,9 +247,6 @@ class InspectionDatabase:
             confidence: Confidence score of the assessment
             defects: List of detected defects (optional)
             timestamp: Timestamp of the inspection (defaults to now)
-            
-        Returns:
-            ID of the newly created record
         """
         if timestamp is None:
             timestamp = datetime.now()
@@ -183,51 +254,75 @@ class InspectionDatabase:
         if defects is not None and not isinstance(defects, str):
             defects = json.dumps(defects)
             
-        cursor = self.conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO inspection_records 
-            (session_id, product_id, product_name, batch_number, quality, confidence, defects, timestamp) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (self.current_session_id, product_id, product_name, batch_number, quality, confidence, defects, timestamp)
-        )
-        self.conn.commit()
-        return cursor.lastrowid
+        with self._lock:
+            self._pending.append(
+                (session_id, product_id, product_name, batch_number, quality, confidence, defects, timestamp)
+            )
+    
+    def add_inspection_records(self, session_id, rows):
+        """
+        Add several inspection records at once
+        
+        The records are buffered like those of add_inspection_record and
+        written together by the next flush().
+        
+        Args:
+            session_id: ID of the inspection session the records belong to
+            rows: Iterable of (product_id, product_name, batch_number, quality,
+                  confidence, defects, timestamp) tuples, with defects given
+                  as a JSON string or None
+        """
+        with self._lock:
+            self._pending.extend((session_id, *row) for row in rows)
+    
+    def flush_if_due(self):
+        """Flush buffered records once enough have accumulated or enough time has passed"""
+        if len(self._pending) >= self.FLUSH_SIZE or \
+           time.monotonic() - self._last_flush > self.FLUSH_INTERVAL:
+            self.flush()
+    
+    def flush(self):
+        """Write all buffered inspection records in a single transaction"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            
+            pending, self._pending = self._pending, []
+            cursor = self.conn.cursor()
+            cursor.executemany(self.INSERT_RECORD_SQL, pending)
+            self.conn.commit()
     
     def add_session_summary(self, summary_data):
         """
         Add a session summary
         
         Args:
-            summary_data: Dictionary containing summary information
+            summary_data: Dictionary containing summary information,
+                including the 'session_id' it summarizes
             
         Returns:
             ID of the newly created summary
         """
-        cursor = self.conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO session_summaries 
-            (session_id, timestamp, product_name, batch_number, company, 
-             total_products, good_products, defective_products, duration, avg_rate) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                self.current_session_id,
-                summary_data.get('timestamp', datetime.now()),
-                summary_data.get('product_name', ''),
-                summary_data.get('batch_number', ''),
-                summary_data.get('company', ''),
-                summary_data.get('total_products', 0),
-                summary_data.get('good_products', 0),
-                summary_data.get('defective_products', 0),
-                summary_data.get('duration', 0),
-                summary_data.get('avg_rate', 0)
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                self.INSERT_SUMMARY_SQL,
+                (
+                    summary_data.get('session_id'),
+                    summary_data.get('timestamp', datetime.now()),
+                    summary_data.get('product_name', ''),
+                    summary_data.get('batch_number', ''),
+                    summary_data.get('company', ''),
+                    summary_data.get('total_products', 0),
+                    summary_data.get('good_products', 0),
+                    summary_data.get('defective_products', 0),
+                    summary_data.get('duration', 0),
+                    summary_data.get('avg_rate', 0)
+                )
             )
-        )
-        self.conn.commit()
-        return cursor.lastrowid
+            self.conn.commit()
+            return cursor.lastrowid
     
     def get_inspection_records(self, session_id=None, limit=None):
         """
@@ -240,50 +335,139 @@ class InspectionDatabase:
         Returns:
             List of inspection records
         """
-        query = "SELECT * FROM inspection_records"
+        with self._lock:
+            query = "SELECT * FROM inspection_records"
+            params = []
+            
+            if session_id:
+                query += " WHERE session_id = ?"
+                params.append(session_id)
+                
+            query += " ORDER BY timestamp DESC"
+            
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+                
+            cursor = self.conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(query, params)
+            
+            return [dict(row) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def _records_filter(session_id=None, batch_number=None, start=None, end=None, product_name=None,
+                        qualities=None):
+        """
+        Build the WHERE clause selecting inspection records
+        
+        Args:
+            session_id: Only select records of this session (optional)
+            batch_number: Only select records of this batch (optional)
+            start: Only select records at or after this time (optional)
+            end: Only select records at or before this time (optional)
+            product_name: Only select records of this product (optional)
+            qualities: Only select records with one of these qualities (optional)
+            
+        Returns:
+            WHERE clause (empty if nothing is filtered) and its parameters
+        """
+        where = ""
+        conditions = []
         params = []
         
         if session_id:
-            query += " WHERE session_id = ?"
+            conditions.append("session_id = ?")
             params.append(session_id)
             
-        query += " ORDER BY timestamp DESC"
-        
-        if limit:
-            query += " LIMIT ?"
-            params.append(limit)
+        if batch_number:
+            conditions.append("batch_number = ?")
+            params.append(batch_number)
             
-        cursor = self.conn.cursor()
-        cursor.execute(query, params)
-        columns = [desc[0] for desc in cursor.description]
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+            
+        if end is not None:
+            conditions.append("timestamp <= ?")
+            params.append(end)
+            
+        if product_name:
+            conditions.append("product_name = ?")
+            params.append(product_name)
+            
+        if qualities:
+            conditions.append("quality IN (" + ", ".join("?" * len(qualities)) + ")")
+            params.extend(qualities)
+            
+        if conditions:
+            where = " WHERE " + " AND ".join(conditions)
         
-        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return where, params
     
-    def get_inspection_records_df(self, session_id=None, limit=None):
+    def get_inspection_records_df(self, session_id=None, batch_number=None, start=None, end=None, limit=None,
+                                  product_name=None, qualities=None):
         """
         Get inspection records as a DataFrame
         
         Args:
             session_id: Filter by session ID (optional)
+            batch_number: Filter by batch number (optional)
+            start: Only return records at or after this time (optional)
+            end: Only return records at or before this time (optional)
             limit: Maximum number of records to return (optional)
+            product_name: Filter by product name (optional)
+            qualities: Only return records with one of these qualities (optional)
             
         Returns:
             DataFrame with inspection records
         """
-        query = "SELECT * FROM inspection_records"
-        params = []
+        where, params = self._records_filter(session_id, batch_number, start, end, product_name, qualities)
         
-        if session_id:
-            query += " WHERE session_id = ?"
-            params.append(session_id)
+        with self._lock:
+            query = "SELECT * FROM inspection_records" + where + " ORDER BY timestamp DESC"
             
-        query += " ORDER BY timestamp DESC"
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+                
+            return pd.read_sql(query, self.conn, params=params)
+    
+    def iter_inspection_records_df(self, chunksize=50000):
+        """
+        Iterate over all inspection records in DataFrames of bounded size
         
-        if limit:
-            query += " LIMIT ?"
-            params.append(limit)
+        Each chunk is read with its own query, continuing after the last
+        record of the previous chunk, so the lock is only held while a chunk
+        is read and writers can proceed while the caller handles it.
+        
+        Args:
+            chunksize: Maximum number of records per DataFrame
+            
+        Yields:
+            DataFrames with consecutive inspection records, newest first
+        """
+        query = "SELECT * FROM inspection_records ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params = [chunksize]
+        
+        while True:
+            with self._lock:
+                chunk = pd.read_sql(query, self.conn, params=params)
             
-        return pd.read_sql(query, self.conn, params=params)
+            if chunk.empty:
+                return
+            
+            yield chunk
+            
+            if len(chunk) < chunksize:
+                return
+            
+            # Continue after the last record of this chunk
+            query = (
+                "SELECT * FROM inspection_records WHERE (timestamp, id) < (?, ?) "
+                "ORDER BY timestamp DESC, id DESC LIMIT ?"
+            )
+            params = [chunk['timestamp'].iat[-1], int(chunk['id'].iat[-1]), chunksize]
     
     def get_session_summaries(self, limit=None):
         """
@@ -295,36 +479,107 @@ class InspectionDatabase:
         Returns:
             DataFrame with session summaries
         """
-        query = "SELECT * FROM session_summaries ORDER BY timestamp DESC"
-        
-        if limit:
-            query += f" LIMIT {limit}"
+        with self._lock:
+            query = "SELECT * FROM session_summaries ORDER BY timestamp DESC"
+            params = []
             
-        return pd.read_sql(query, self.conn)
+            if limit:
+                query += " LIMIT ?"
+                params.append(limit)
+                
+            return pd.read_sql(query, self.conn, params=params)
     
-    def get_statistics(self):
+    def distinct_batches(self):
         """
-        Get overall statistics
+        Get the batch numbers that have inspection records
         
         Returns:
-            Dictionary with statistics
+            Sorted list of batch numbers
         """
-        # Get total counts
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM inspection_records")
-        total_inspections = cursor.fetchone()[0]
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT DISTINCT batch_number FROM inspection_records ORDER BY batch_number")
+            return [row[0] for row in cursor.fetchall()]
+    
+    def distinct_products(self):
+        """
+        Get the product names that have inspection records
         
-        cursor.execute("SELECT COUNT(*) FROM inspection_records WHERE quality = 'good'")
-        good_count = cursor.fetchone()[0]
+        Returns:
+            Sorted list of product names
+        """
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT DISTINCT product_name FROM inspection_records ORDER BY product_name")
+            return [row[0] for row in cursor.fetchall()]
+    
+    def current_version(self):
+        """
+        Get a cheap marker of the stored data, which changes whenever
+        inspection records or session summaries are added
+        
+        Returns:
+            Tuple with the highest inspection record and session summary IDs
+        """
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT (SELECT MAX(id) FROM inspection_records), (SELECT MAX(id) FROM session_summaries)"
+            )
+            return cursor.fetchone()
+    
+    def get_counts(self, start=None, end=None, batch_number=None, product_name=None):
+        """
+        Get the number of inspected products by quality
+        
+        Args:
+            start: Only count records at or after this time (optional)
+            end: Only count records at or before this time (optional)
+            batch_number: Only count records of this batch (optional)
+            product_name: Only count records of this product (optional)
+            
+        Returns:
+            Dictionary with 'good', 'bad' and 'total' counts
+        """
+        where, params = self._records_filter(
+            batch_number=batch_number, start=start, end=end, product_name=product_name
+        )
+        
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT quality, COUNT(*) FROM inspection_records" + where + " GROUP BY quality",
+                params
+            )
+            counts = dict(cursor.fetchall())
         
-        cursor.execute("SELECT COUNT(*) FROM inspection_records WHERE quality = 'bad'")
-        bad_count = cursor.fetchone()[0]
+        good_count = counts.get('good', 0)
+        bad_count = counts.get('bad', 0)
+        return {'good': good_count, 'bad': bad_count, 'total': good_count + bad_count}
+    
+    def get_statistics(self, start=None, end=None):
+        """
+        Get overall statistics
         
-        cursor.execute("SELECT COUNT(DISTINCT session_id) FROM inspection_records")
-        total_sessions = cursor.fetchone()[0]
+        Args:
+            start: Only count records at or after this time (optional)
+            end: Only count records at or before this time (optional)
+            
+        Returns:
+            Dictionary with statistics
+        """
+        where, params = self._records_filter(start=start, end=end)
         
-        cursor.execute("SELECT COUNT(DISTINCT product_name) FROM inspection_records")
-        total_products = cursor.fetchone()[0]
+        with self._lock:
+            # Get all counts in a single pass
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT COUNT(*), COALESCE(SUM(quality = 'good'), 0), COALESCE(SUM(quality = 'bad'), 0), "
+                "COUNT(DISTINCT session_id), COUNT(DISTINCT product_name) "
+                "FROM inspection_records" + where,
+                params
+            )
+            total_inspections, good_count, bad_count, total_sessions, total_products = cursor.fetchone()
         
         # Calculate percentages
         good_percentage = (good_count / total_inspections * 100) if total_inspections > 0 else 0
@@ -342,9 +597,21 @@ class InspectionDatabase:
     
     def close(self):
         """Close the database connection"""
-        if self.conn:
-            self.conn.close()
+        with self._lock:
+            if self.conn:
+                self.flush()
+                self.conn.close()
             
     def __del__(self):
         """Cleanup on object destruction"""
         self.close()
+
+@st.cache_resource
+def get_db():
+    """
+    Get the inspection database shared by all sessions and pages
+    
+    Returns:
+        InspectionDatabase backed by inspections.db
+    """
+    return InspectionDatabase(db_path="inspections.db")
@@ -3,27 +3,47 @@ import numpy as np
 import time
 import random
 import math
+import threading
+from utils._blend import alpha_over
 
-def create_water_bottle(frame_shape, position=None, quality='good'):
-    """Create a synthetic water bottle image
+# Number of pre-rendered bottle sprites kept per quality
+SPRITE_VARIANTS = 32
+
+# Random generators for the per-frame draws, one per thread since each
+# session's frame source generates demo frames on its own thread and numpy
+# generators aren't thread-safe
+_RNG_LOCAL = threading.local()
+
+# Pre-rendered bottle sprites by quality, filled on first use
+_SPRITE_CACHE = {}
+
+# Pre-rendered conveyor belt backgrounds by frame size, filled on first use
+_BG_CACHE = {}
+
+# Processing info overlay with its fixed title drawn, filled on first use
+_OVERLAY_TEMPLATE = None
+
+def _rng():
+    """
+    Get the random generator of the calling thread
+    
+    Returns:
+        numpy random Generator, created on the thread's first call
+    """
+    rng = getattr(_RNG_LOCAL, 'rng', None)
+    if rng is None:
+        rng = _RNG_LOCAL.rng = np.random.default_rng()
+    return rng
+
+def _draw_bottle(quality):
+    """Draw a synthetic water bottle with a random cap, water level and defect
     
     Args:
-        frame_shape: Shape of the target frame (height, width)
-        position: (x,y) position where to place the bottle
         quality: 'good' or 'bad' to simulate defects
         
     Returns:
-        Mask and bottle image to overlay
+        RGBA bottle image
     """
-    h, w = frame_shape[:2]
-    
-    # If position is not provided, use random position
-    if position is None:
-        x = random.randint(w//4, 3*w//4)
-        y = random.randint(h//4, 3*h//4)
-    else:
-        x, y = position
-    
     # Create bottle shape
     bottle_h, bottle_w = 300, 120
     bottle = np.zeros((bottle_h, bottle_w, 4), dtype=np.uint8)
@@ -59,24 +79,112 @@ def create_water_bottle(frame_shape, position=None, quality='good'):
         elif defect_type == 'label':
             # Crooked label
             M = cv2.getRotationMatrix2D((bottle_w//2, label_y + 50), random.uniform(10, 20), 1.0)
-            label_mask = np.zeros_like(bottle)
-            cv2.rectangle(label_mask, (20, label_y), (bottle_w-20, bottle_h-20), (255, 255, 255, 255), -1)
-            rotated_mask = cv2.warpAffine(label_mask, M, (bottle_w, bottle_h))
-            
-            # Apply rotated mask
-            bottle_without_label = bottle.copy()
-            cv2.rectangle(bottle_without_label, (20, label_y), (bottle_w-20, bottle_h-20), (0, 0, 0, 0), -1)
+            # The label is an opaque white rectangle, so rotating a binary
+            # single-channel mask of it without interpolation is enough
+            label_mask = np.zeros((bottle_h, bottle_w), dtype=np.uint8)
+            cv2.rectangle(label_mask, (20, label_y), (bottle_w-20, bottle_h-20), 255, -1)
+            rotated_mask = cv2.warpAffine(label_mask, M, (bottle_w, bottle_h), flags=cv2.INTER_NEAREST,
+                                          borderMode=cv2.BORDER_CONSTANT, borderValue=0)
             
-            # Add rotated label
-            for c in range(4):
-                bottle[:,:,c] = np.where(rotated_mask[:,:,c] > 0, 
-                                         np.maximum(bottle[:,:,c], rotated_mask[:,:,c]), 
-                                         bottle_without_label[:,:,c])
+            # Remove the straight label and paint the rotated one over all channels
+            cv2.rectangle(bottle, (20, label_y), (bottle_w-20, bottle_h-20), (0, 0, 0, 0), -1)
+            bottle[rotated_mask > 0] = 255
         
         elif defect_type == 'cap':
             # Missing or damaged cap
             cv2.rectangle(bottle, (40, 0), (bottle_w-40, 20), (0, 0, 0, 0), -1)
     
+    return bottle
+
+def _bottle_sprites(quality):
+    """Get the pre-rendered bottle sprites of a quality, rendering them on first use
+    
+    Args:
+        quality: 'good' or 'bad'
+        
+    Returns:
+        List of read-only RGBA bottle images with premultiplied alpha
+    """
+    sprites = _SPRITE_CACHE.get(quality)
+    if sprites is None:
+        sprites = [_draw_bottle(quality) for _ in range(SPRITE_VARIANTS)]
+        for sprite in sprites:
+            # Premultiply the colors by alpha, so blending the sprite only
+            # has to scale the background
+            rgb = sprite[:,:,:3] * sprite[:,:,3:4].astype(np.uint16)
+            sprite[:,:,:3] = (rgb + (rgb >> 8) + 128) >> 8
+            sprite.flags.writeable = False
+        _SPRITE_CACHE[quality] = sprites
+    return sprites
+
+def _background(frame_size):
+    """Get the conveyor belt background of a frame size, rendering it on first use
+    
+    Args:
+        frame_size: Size of the frame (height, width, channels)
+        
+    Returns:
+        Read-only BGR background image
+    """
+    key = tuple(frame_size[:2])
+    background = _BG_CACHE.get(key)
+    if background is None:
+        h, w = key
+        
+        # Create background (conveyor belt)
+        background = np.full((h, w, 3), 80, dtype=np.uint8)
+        
+        # Add conveyor belt texture, one gray line every 20 rows
+        background[::20] = 60
+        
+        # Add side rails
+        cv2.rectangle(background, (0, h//3), (w, h//3 + 10), (100, 100, 100), -1)
+        cv2.rectangle(background, (0, 2*h//3), (w, 2*h//3 + 10), (100, 100, 100), -1)
+        
+        background.flags.writeable = False
+        _BG_CACHE[key] = background
+    return background
+
+def _overlay_template():
+    """Get the processing info overlay with its fixed title, rendering it on first use
+    
+    Returns:
+        Read-only BGR overlay image
+    """
+    global _OVERLAY_TEMPLATE
+    if _OVERLAY_TEMPLATE is None:
+        overlay = np.full((140, 250, 3), 50, dtype=np.uint8)
+        cv2.putText(overlay, "defect_recognition", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        overlay.flags.writeable = False
+        _OVERLAY_TEMPLATE = overlay
+    return _OVERLAY_TEMPLATE
+
+def create_water_bottle(frame_shape, position=None, quality='good'):
+    """Create a synthetic water bottle image
+    
+    The bottle is picked from a set of pre-rendered sprites, so it must not
+    be modified. Its colors are premultiplied by its alpha channel.
+    
+    Args:
+        frame_shape: Shape of the target frame (height, width)
+        position: (x,y) position where to place the bottle
+        quality: 'good' or 'bad' to simulate defects
+        
+    Returns:
+        Mask and bottle image to overlay
+    """
+    h, w = frame_shape[:2]
+    
+    # If position is not provided, use random position
+    if position is None:
+        x, y = _rng().integers((w//4, h//4), (3*w//4, 3*h//4), endpoint=True).tolist()
+    else:
+        x, y = position
+    
+    sprites = _bottle_sprites(quality)
+    bottle = sprites[_rng().integers(len(sprites))]
+    bottle_h, bottle_w = bottle.shape[:2]
+    
     # Calculate bounding box on target frame
     x1 = max(0, x - bottle_w//2)
     y1 = max(0, y - bottle_h//2)
@@ -97,53 +205,37 @@ def get_demo_frame(frame_size=(720, 1280, 3), show_detection=True):
     """
     h, w = frame_size[:2]
     
-    # Create background (conveyor belt)
-    frame = np.ones((h, w, 3), dtype=np.uint8) * 80
-    
-    # Add conveyor belt texture
-    for i in range(0, h, 20):
-        cv2.line(frame, (0, i), (w, i), (60, 60, 60), 1)
-    
-    # Add side rails
-    cv2.rectangle(frame, (0, h//3), (w, h//3 + 10), (100, 100, 100), -1)
-    cv2.rectangle(frame, (0, 2*h//3), (w, 2*h//3 + 10), (100, 100, 100), -1)
+    # Start from a copy of the conveyor belt background
+    frame = _background(frame_size).copy()
     
     # Decide how many bottles to show (1-3)
-    num_bottles = random.randint(1, 3)
+    rng = _rng()
+    num_bottles = int(rng.integers(1, 3, endpoint=True))
     bottles_info = []
     
+    # Randomly determine the quality and confidence of all bottles at once
+    qualities = np.where(rng.random(num_bottles) < 0.8, 'good', 'bad').tolist()
+    confidences = rng.uniform(0.8, 0.99, num_bottles).tolist()
+    
     # Generate bottle positions
-    for i in range(num_bottles):
+    for i, (quality, confidence) in enumerate(zip(qualities, confidences)):
         x = w // (num_bottles + 1) * (i + 1)
         y = h // 2
         
-        # Randomly determine quality
-        quality = 'good' if random.random() < 0.8 else 'bad'
-        
         # Create bottle image
         bottle_img, bbox = create_water_bottle((h, w), (x, y), quality)
         bottles_info.append({
             'id': 30 + i,
             'bbox': bbox,
             'quality': quality,
-            'confidence': random.uniform(0.8, 0.99),
-            'bottle_img': bottle_img
+            'confidence': confidence
         })
-    
-    # Add bottles to frame
-    for bottle_info in bottles_info:
-        x, y, bottle_w, bottle_h = bottle_info['bbox']
-        bottle_img = bottle_info['bottle_img']
         
-        # Extract region of interest
-        roi = frame[y:y+bottle_h, x:x+bottle_w]
-        
-        # Only modify the frame where bottle is not transparent
-        for c in range(3):
-            roi[:,:,c] = np.where(bottle_img[:,:,3] > 0, 
-                               ((bottle_img[:,:,c] * bottle_img[:,:,3] // 255) + 
-                                (roi[:,:,c] * (255 - bottle_img[:,:,3]) // 255)), 
-                               roi[:,:,c])
+        # Blend the premultiplied bottle over its region of the frame right
+        # away. Bottles never overlap, so blending only their own regions
+        # touches fewer pixels than one blend over a combined layer.
+        bx, by, bottle_w, bottle_h = bbox
+        alpha_over(frame[by:by+bottle_h, bx:bx+bottle_w], bottle_img)
     
     # Add detection visualization
     if show_detection:
@@ -175,9 +267,9 @@ def get_demo_frame(frame_size=(720, 1280, 3), show_detection=True):
     
     # Add processing info overlay
     if show_detection:
-        overlay = np.ones((140, 250, 3), dtype=np.uint8) * 50
-        cv2.putText(overlay, "defect_recognition", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(overlay, f"Speed: {random.uniform(1.0, 3.0):.1f}ms preprocess", (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        # Only the per-frame lines are drawn on a copy of the titled overlay
+        overlay = _overlay_template().copy()
+        cv2.putText(overlay, f"Speed: {_rng().uniform(1.0, 3.0):.1f}ms preprocess", (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
         
         for i, bottle_info in enumerate(bottles_info):
             y_pos = 60 + i * 20
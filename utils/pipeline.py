@@ -0,0 +1,141 @@
+import asyncio
+import queue
+import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+class InspectionPipeline:
+    """
+    Class to run frame capture and detection in the background
+    as a capture -> detect pipeline, so the UI only renders results
+    """
+    def __init__(self, detector, frame_source, frame_interval=0.1, queue_size=2, batch_size=4,
+                 idle_timeout=10.0):
+        """
+        Initialize the inspection pipeline
+        Args:
+            detector: ProductDetector used to process frames
+            frame_source: Function returning the next frame
+            frame_interval: Minimum time between captured frames in seconds
+            queue_size: Maximum number of frames in flight between stages
+            batch_size: Maximum number of queued frames detected in one call
+            idle_timeout: Stop once results have not been fetched for this
+                many seconds, e.g. after the browser tab was closed
+        """
+        self.detector = detector
+        self.frame_source = frame_source
+        self.frame_interval = frame_interval
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        # Output frames are drawn into a ring of reused buffers. It is large
+        # enough that no buffer is overwritten while a result using it is
+        # still queued or being rendered.
+        self._buffers = [None] * (2 * queue_size + batch_size)
+        self._buffer_index = 0
+        self.results = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.stopped = True
+        self.last_poll_time = 0
+        self.last_frame_time = 0
+        self.fps = 0
+
+    def start(self):
+        """Start the pipeline thread"""
+        self.stopped = False
+        self.last_poll_time = time.monotonic()
+        self.thread = Thread(target=asyncio.run, args=(self._run(),))
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    async def _run(self):
+        """Run the capture and detection stages until stopped"""
+        loop = asyncio.get_running_loop()
+        frame_queue = asyncio.Queue(maxsize=self.queue_size)
+        capture_executor = ThreadPoolExecutor(1)
+        detect_executor = ThreadPoolExecutor(1)
+
+        async def capture():
+            while True:
+                frame = await loop.run_in_executor(capture_executor, self.frame_source)
+                if frame is not None:
+                    await frame_queue.put(frame)
+                if self.frame_interval:
+                    await asyncio.sleep(self.frame_interval)
+
+        async def detect():
+            while True:
+                # Wait for a frame, then take any others already queued
+                frames = [await frame_queue.get()]
+                while len(frames) < self.batch_size and not frame_queue.empty():
+                    frames.append(frame_queue.get_nowait())
+                outs = [self._next_buffer(frame) for frame in frames]
+                results = await loop.run_in_executor(
+                    detect_executor, self.detector.process_frames, frames, True, outs
+                )
+
+                current_time = time.time()
+                if self.last_frame_time > 0:
+                    self.fps = len(frames) / (current_time - self.last_frame_time)
+                self.last_frame_time = current_time
+
+                # Hand the results over to the UI, waiting while it catches up
+                for result in results:
+                    await loop.run_in_executor(detect_executor, self._put_result, result)
+
+        tasks = [asyncio.create_task(capture()), asyncio.create_task(detect())]
+        try:
+            while not self.stopped:
+                await asyncio.sleep(0.05)
+                if time.monotonic() - self.last_poll_time > self.idle_timeout:
+                    # Nobody is reading the results anymore
+                    self.stopped = True
+        finally:
+            for task in tasks:
+                task.cancel()
+            capture_executor.shutdown(wait=False, cancel_futures=True)
+            detect_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _next_buffer(self, frame):
+        """Return the next output buffer in the ring, allocated to match frame"""
+        buf = self._buffers[self._buffer_index]
+        if buf is None or buf.shape != frame.shape or buf.dtype != frame.dtype:
+            buf = np.empty_like(frame)
+            self._buffers[self._buffer_index] = buf
+        self._buffer_index = (self._buffer_index + 1) % len(self._buffers)
+        return buf
+
+    def _put_result(self, result):
+        """Queue a result for the UI, giving up once the pipeline is stopped"""
+        while not self.stopped:
+            try:
+                self.results.put(result, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get_results(self):
+        """Return all (frame, detections) results completed since the last call"""
+        self.last_poll_time = time.monotonic()
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def get_fps(self):
+        """Return the fps of the detection stage"""
+        return self.fps
+
+    def stop(self):
+        """Stop the pipeline thread"""
+        self.stopped = True
+        if self.thread is not None:
+            self.thread.join()
+
+    def __del__(self):
+        """Cleanup on object destruction"""
+        self.stop()
@@ -1,13 +1,14 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import streamlit as st
 import time
 from datetime import datetime
 import io
 import base64
 from fpdf import FPDF
-import tempfile
-import os
+from threading import Lock
+
+# Maximum number of inspection records listed in a PDF report
+PDF_RECORDS_LIMIT = 20
 
 class PDF(FPDF):
     """Extended FPDF class for report generation"""
@@ -22,70 +23,58 @@ class PDF(FPDF):
         self.set_font('Arial', 'I', 8)
         self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
 
-def generate_summary_chart(product_count):
-    """Generate summary chart for the report"""
-    plt.figure(figsize=(10, 6))
-    
-    # Create pie chart
-    labels = ['Good Products', 'Defective Products']
-    sizes = [product_count['good'], product_count['bad']]
-    colors = ['#4CAF50', '#F44336']
-    
-    plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
-    plt.axis('equal')
-    plt.title('Product Quality Distribution')
-    
-    # Save to bytes buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close()
-    
-    return buf
+# Chart figures reused between reports by name, created on first use
+_FIGURES = {}
+_FIGURE_LOCK = Lock()
 
-def generate_timeline_chart(inspection_db):
-    """Generate timeline of inspections"""
-    # Get inspection data
-    df = inspection_db.get_inspection_records_df()
-    
-    if len(df) == 0:
-        # If no data, return empty buffer
-        buf = io.BytesIO()
-        plt.figure(figsize=(10, 6))
-        plt.text(0.5, 0.5, 'No inspection data available', 
-                horizontalalignment='center', verticalalignment='center')
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        plt.close()
-        return buf
-    
-    # Group by timestamp rounded to minutes and count by quality
-    df['timestamp_rounded'] = pd.to_datetime(df['timestamp']).dt.floor('1min')
-    timeline = df.groupby(['timestamp_rounded', 'quality']).size().unstack(fill_value=0)
-    
-    # Create plot
-    plt.figure(figsize=(12, 6))
-    if 'good' in timeline.columns:
-        plt.plot(timeline.index, timeline['good'], 'g-', label='Good Products')
-    if 'bad' in timeline.columns:
-        plt.plot(timeline.index, timeline['bad'], 'r-', label='Defective Products')
+def _figure(name, figsize):
+    """
+    Get the reusable chart figure of a name, cleared and resized
     
-    plt.xlabel('Time')
-    plt.ylabel('Count')
-    plt.title('Inspection Timeline')
-    plt.legend()
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    Figures are created directly instead of through pyplot, so they need no
+    GUI backend or figure manager. Callers must hold _FIGURE_LOCK while
+    drawing and saving the figure.
     
-    # Save to bytes buffer
+    Args:
+        name: Name of the chart the figure is used for
+        figsize: Figure size in inches (width, height)
+        
+    Returns:
+        Empty matplotlib Figure
+    """
+    fig = _FIGURES.get(name)
+    if fig is None:
+        from matplotlib.figure import Figure
+        fig = _FIGURES[name] = Figure()
+    fig.clear()
+    fig.set_size_inches(figsize)
+    return fig
+
+def _save_png(fig):
+    """Save a figure as PNG into a BytesIO buffer rewound to the start"""
     buf = io.BytesIO()
-    plt.savefig(buf, format='png')
+    fig.savefig(buf, format='png')
     buf.seek(0)
-    plt.close()
-    
     return buf
 
+def generate_summary_chart(product_count):
+    """Generate summary chart for the report"""
+    with _FIGURE_LOCK:
+        fig = _figure('summary', (10, 6))
+        ax = fig.add_subplot()
+        
+        # Create pie chart
+        labels = ['Good Products', 'Defective Products']
+        sizes = [product_count['good'], product_count['bad']]
+        colors = ['#4CAF50', '#F44336']
+        
+        ax.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
+        ax.axis('equal')
+        ax.set_title('Product Quality Distribution')
+        
+        # Save to bytes buffer
+        return _save_png(fig)
+
 def generate_pdf_report(inspection_db, product_count, product_info):
     """
     Generate a PDF report with inspection results
@@ -98,6 +87,31 @@ def generate_pdf_report(inspection_db, product_count, product_info):
     Returns:
         BytesIO object containing the PDF
     """
+    return build_pdf_report(
+        inspection_db.get_inspection_records_df(limit=PDF_RECORDS_LIMIT), product_count, product_info
+    )
+
+def build_pdf_report(records_df, product_count, product_info, generated_at=None):
+    """
+    Build a PDF report from inspection records
+    
+    Takes the records by value instead of the database, so it can run in
+    a worker process. Only the first PDF_RECORDS_LIMIT records are listed,
+    so callers only need to load those.
+    
+    Args:
+        records_df: DataFrame with the most recent inspection records
+        product_count: Dictionary with product counts, also counting the
+            records that aren't listed
+        product_info: Dictionary with product information
+        generated_at: Time shown as the report's generation time (defaults to now)
+        
+    Returns:
+        BytesIO object containing the PDF
+    """
+    if generated_at is None:
+        generated_at = datetime.now()
+    
     # Create PDF object
     pdf = PDF()
     pdf.add_page()
@@ -109,7 +123,7 @@ def generate_pdf_report(inspection_db, product_count, product_info):
     
     # Add date and time
     pdf.set_font('Arial', '', 12)
-    pdf.cell(0, 10, f"Report Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 0, 1)
+    pdf.cell(0, 10, f"Report Generated: {generated_at.strftime('%Y-%m-%d %H:%M:%S')}", 0, 1)
     pdf.ln(5)
     
     # Add product information
@@ -130,19 +144,15 @@ def generate_pdf_report(inspection_db, product_count, product_info):
     pdf.cell(0, 10, f"Defective Products: {product_count['bad']} ({product_count['bad']/max(product_count['total'], 1):.1%})", 0, 1)
     pdf.ln(5)
     
-    # Generate and add summary chart
+    # Generate and add summary chart, straight from the in-memory PNG
     chart_buf = generate_summary_chart(product_count)
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-        tmp.write(chart_buf.read())
-        tmp_name = tmp.name
+    chart_buf.seek(0)
     
     pdf.set_font('Arial', 'B', 14)
     pdf.cell(0, 10, 'Quality Distribution', 0, 1)
-    pdf.image(tmp_name, x=40, w=130)
-    os.unlink(tmp_name)  # Delete the temporary file
+    pdf.image(chart_buf, x=40, w=130)
     
     # Add inspection records table if available
-    records_df = inspection_db.get_inspection_records_df()
     if len(records_df) > 0:
         pdf.add_page()
         pdf.set_font('Arial', 'B', 14)
@@ -156,22 +166,21 @@ def generate_pdf_report(inspection_db, product_count, product_info):
         pdf.cell(30, 10, 'Confidence', 1, 0, 'C')
         pdf.cell(60, 10, 'Timestamp', 1, 1, 'C')
         
-        # Add table rows (limit to 20 records to avoid large PDFs)
+        # Add table rows (limit to PDF_RECORDS_LIMIT records to avoid large PDFs)
+        records_df = records_df.head(PDF_RECORDS_LIMIT)
         pdf.set_font('Arial', '', 10)
-        for i, row in records_df.head(20).iterrows():
-            pdf.cell(20, 10, str(row['product_id']), 1, 0, 'C')
-            pdf.cell(50, 10, str(row['product_name']), 1, 0, 'C')
-            pdf.cell(30, 10, str(row['quality']), 1, 0, 'C')
-            pdf.cell(30, 10, f"{row['confidence']:.2f}", 1, 0, 'C')
-            pdf.cell(60, 10, str(row['timestamp']), 1, 1, 'C')
+        for row in records_df.itertuples(index=False):
+            pdf.cell(20, 10, str(row.product_id), 1, 0, 'C')
+            pdf.cell(50, 10, str(row.product_name), 1, 0, 'C')
+            pdf.cell(30, 10, str(row.quality), 1, 0, 'C')
+            pdf.cell(30, 10, f"{row.confidence:.2f}", 1, 0, 'C')
+            pdf.cell(60, 10, str(row.timestamp), 1, 1, 'C')
         
-        if len(records_df) > 20:
-            pdf.cell(0, 10, f"... and {len(records_df) - 20} more records", 0, 1, 'C')
+        if product_count['total'] > len(records_df):
+            pdf.cell(0, 10, f"... and {product_count['total'] - len(records_df)} more records", 0, 1, 'C')
     
     # Save PDF to BytesIO
-    pdf_output = io.BytesIO()
-    pdf.output(pdf_output)
-    pdf_output.seek(0)
+    pdf_output = io.BytesIO(pdf.output())
     
     return pdf_output
 
@@ -187,12 +196,30 @@ def generate_excel_report(inspection_db, product_count, product_info):
     Returns:
         BytesIO object containing the Excel file
     """
+    return build_excel_report(inspection_db.get_inspection_records_df(), product_count, product_info)
+
+def build_excel_report(records_df, product_count, product_info, generated_at=None):
+    """
+    Build an Excel report from inspection records
+    
+    Takes the records by value instead of the database, so it can run in
+    a worker process.
+    
+    Args:
+        records_df: DataFrame with inspection records
+        product_count: Dictionary with product counts
+        product_info: Dictionary with product information
+        generated_at: Time shown as the report's generation time (defaults to now)
+        
+    Returns:
+        BytesIO object containing the Excel file
+    """
+    if generated_at is None:
+        generated_at = datetime.now()
+    
     # Create Excel writer object
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Get inspection records
-        records_df = inspection_db.get_inspection_records_df()
-        
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
         # Create summary sheet
         summary = pd.DataFrame({
             'Information': [
@@ -207,7 +234,7 @@ def generate_excel_report(inspection_db, product_count, product_info):
                 'Defective Products (%)'
             ],
             'Value': [
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                generated_at.strftime('%Y-%m-%d %H:%M:%S'),
                 product_info['name'],
                 product_info['batch_number'],
                 product_info['company'],
@@ -229,7 +256,7 @@ def generate_excel_report(inspection_db, product_count, product_info):
     output.seek(0)
     return output
 
-def generate_session_summary(inspection_db, product_count, product_info, session_duration):
+def generate_session_summary(inspection_db, product_count, product_info, session_duration, session_id=None):
     """
     Generate a session summary and store it in the database
     
@@ -238,9 +265,11 @@ def generate_session_summary(inspection_db, product_count, product_info, session
         product_count: Dictionary with product counts
         product_info: Dictionary with product information
         session_duration: Duration of the inspection session in seconds
+        session_id: ID of the inspection session being summarized
     """
     # Create summary record
     summary = {
+        'session_id': session_id,
         'timestamp': datetime.now(),
         'product_name': product_info['name'],
         'batch_number': product_info['batch_number'],